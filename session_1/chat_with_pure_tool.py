@@ -1,21 +1,182 @@
 import os
 import json
+import logging
+import argparse
+import time
+import hashlib
+import functools
+import threading
+from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from openai import OpenAI
-from pprint import pprint
+from openai.types.chat import ChatCompletion
 from dotenv import load_dotenv
+from typing import List, Dict, Any, Callable, Optional
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Initialize OpenAI client
 client = OpenAI(
     api_key=os.environ.get("OPENAI_API_KEY"),
 )
 
+# Connect and read timeouts for svatkyapi.cz requests
+SVATKY_TIMEOUT = (3.05, 10)
+
+
+@functools.lru_cache(maxsize=None)
+def get_session() -> requests.Session:
+    """Shared HTTP session so svatkyapi.cz calls reuse keep-alive connections."""
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,  # Return the last response, the tools check its status
+    )
+    session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retries),
+    )
+    return session
+
+
+def warm_up_session():
+    """Open the svatkyapi.cz connection (DNS, TCP, TLS) before the first tool call needs it."""
+    try:
+        get_session().head("https://svatkyapi.cz/", timeout=3)
+    except requests.RequestException:
+        pass  # The tool call will simply pay for the connection itself
+
+
+# Runs while the first LLM call is in flight
+threading.Thread(target=warm_up_session, daemon=True).start()
+
+
+# Completions of identical deterministic requests, kept on disk for a day so that
+# repeated runs of the script do not pay for the same LLM call again
+LLM_CACHE_DIR = Path.home() / ".cache" / "course_ai_agents" / "completions"
+LLM_CACHE_TTL = 86400
+
+
+def _load_cached_completion(key: str) -> Optional[ChatCompletion]:
+    try:
+        with open(LLM_CACHE_DIR / f"{key}.json", encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry["expires"] > time.time():
+            return ChatCompletion.model_validate(entry["response"])
+    except (OSError, ValueError, KeyError):
+        pass  # A missing or unreadable entry is a miss
+    return None
+
+
+def _store_completion(key: str, response: ChatCompletion):
+    entry = {"expires": time.time() + LLM_CACHE_TTL, "response": response.model_dump(mode="json")}
+    path = LLM_CACHE_DIR / f"{key}.json"
+    # Write to a temporary file first so a concurrent reader never sees half an entry
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not store completion in cache: %s", e)
+
+
+def _cache_key(model: str, messages, temperature: float = 0, **kwargs) -> str:
+    if kwargs.get("tools") is tools:
+        # The tool schemas never change, use their JSON serialized once at import
+        kwargs["tools"] = TOOLS_JSON
+    payload = {"model": model, "messages": messages, "temperature": temperature, **kwargs}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def create_completion(
+    model: str,
+    messages,
+    temperature: float = 0,
+    on_delta: Optional[Callable[[str], None]] = None,
+    **kwargs,
+) -> ChatCompletion:
+    """
+    Call the chat completions API, reusing stored responses to repeated temperature=0 requests.
+
+    When on_delta is given the response is streamed and on_delta receives the text
+    as it is generated, so an answer can be shown before it is complete.
+    """
+    request = dict(model=model, messages=messages, temperature=temperature, **kwargs)
+    if temperature > 0:
+        if on_delta:
+            return _stream_completion(on_delta, **request)
+        return client.chat.completions.create(**request)
+
+    key = _cache_key(**request)
+    response = _load_cached_completion(key)
+    if response is not None:
+        if on_delta and response.choices[0].message.content:
+            on_delta(response.choices[0].message.content)
+        return response
+
+    if on_delta:
+        response = _stream_completion(on_delta, **request)
+    else:
+        response = client.chat.completions.create(**request)
+    _store_completion(key, response)
+    return response
+
+
+def _stream_completion(on_delta: Callable[[str], None], **request) -> ChatCompletion:
+    """Stream a chat completion, passing content deltas to on_delta, and assemble the full response."""
+    stream = client.chat.completions.create(stream=True, **request)
+    completion: Dict[str, Any] = {"object": "chat.completion"}
+    content: List[str] = []
+    tool_calls: Dict[int, Dict[str, Any]] = {}
+    finish_reason = "stop"
+
+    for chunk in stream:
+        completion.update(id=chunk.id, created=chunk.created, model=chunk.model)
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.delta.content:
+            content.append(choice.delta.content)
+            on_delta(choice.delta.content)
+        # Tool calls arrive in shards, the first shard of each call carries its id and name
+        for tc in choice.delta.tool_calls or []:
+            call = tool_calls.setdefault(
+                tc.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+            )
+            if tc.id:
+                call["id"] = tc.id
+            if tc.function and tc.function.name:
+                call["function"]["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                call["function"]["arguments"] += tc.function.arguments
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+
+    message = {
+        "role": "assistant",
+        "content": "".join(content) or None,
+        "tool_calls": [tool_calls[i] for i in sorted(tool_calls)] or None,
+    }
+    completion["choices"] = [{"index": 0, "finish_reason": finish_reason, "message": message}]
+    return ChatCompletion.model_validate(completion)
+
+
 # Tool functions
 def get_name_for_day(date: str):
-    response = requests.get(f"https://svatkyapi.cz/api/day/{date}")
+    try:
+        response = get_session().get(f"https://svatkyapi.cz/api/day/{date}", timeout=SVATKY_TIMEOUT)
+    except requests.RequestException:
+        # Timeouts and connection errors are reported like a bad status
+        return {"date": date, "name": "Error fetching data"}
     if response.status_code == 200:
         data = response.json()
         name = data.get("name")
@@ -45,22 +206,33 @@ tools = [
     }
 ]
 
+# tools is passed to the API by identity and never modified, so it is serialized only once
+TOOLS_JSON = json.dumps(tools, sort_keys=True)
+
 available_functions = {
     "get_name_for_day": get_name_for_day,
 }
 
+
+def print_delta(text: str):
+    print(text, end="", flush=True)
+
+
 # Function to process messages and handle function calls
 def get_completion_from_messages(messages, model="gpt-4o"):
-    response = client.chat.completions.create(
+    response = create_completion(
         model=model,
         messages=messages,
         tools=tools,  # Custom tools
-        tool_choice="auto"  # Allow AI to decide if a tool should be called
+        tool_choice="auto",  # Allow AI to decide if a tool should be called
+        on_delta=print_delta,  # Show a direct answer while it is generated
     )
 
     response_message = response.choices[0].message
+    if response_message.content:
+        print()  # End the streamed line
 
-    print("First response:", response_message)
+    logger.debug("First response: %s", response_message)
 
     if response_message.tool_calls:
         # Find the tool call content
@@ -75,7 +247,7 @@ def get_completion_from_messages(messages, model="gpt-4o"):
         function_to_call = available_functions[function_name]
         function_response = function_to_call(**function_args)
 
-        print(function_response)
+        logger.debug("Tool result: %s", function_response)
 
         messages.append({
             "role": "assistant",
@@ -85,7 +257,7 @@ def get_completion_from_messages(messages, model="gpt-4o"):
                     "type": "function",
                     "function": {
                         "name": function_name,
-                        "arguments": json.dumps(function_args),
+                        "arguments": tool_call.function.arguments,
                     }
                 }
             ]
@@ -98,20 +270,29 @@ def get_completion_from_messages(messages, model="gpt-4o"):
         })
 
         # Second call to get final response based on function output
-        second_response = client.chat.completions.create(
+        second_response = create_completion(
             model=model,
             messages=messages,
             tools=tools,
-            tool_choice="auto"
+            tool_choice="auto",
+            on_delta=print_delta,
         )
         final_answer = second_response.choices[0].message
+        if final_answer.content:
+            print()  # End the streamed line
 
-        print("Second response:", final_answer)
+        logger.debug("Second response: %s", final_answer)
         return final_answer
 
     return response_message
 
 # Example usage
+parser = argparse.ArgumentParser(description="Single LLM call with a name day tool.")
+parser.add_argument("--verbose", action="store_true", help="Log intermediate responses and tool results.")
+args = parser.parse_args()
+logging.basicConfig(format="%(message)s")
+logger.setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+
 messages = [
     {"role": "system", "content": "You are a helpful AI assistant."},
     {"role": "user", "content": "Kdo měl svátek 28. října 2024?"},
@@ -120,10 +301,8 @@ messages = [
 
 response = get_completion_from_messages(messages)
 print("--- Full response: ---")
-pprint(response)
-print("--- Response text: ---")
-content = getattr(response, "content", None)
-if content:
-    print(content)
-else:
+# Serialized by pydantic's compiled core instead of walking the object tree in Python
+print(response.model_dump_json(indent=2))
+# The response text itself was already streamed above
+if not getattr(response, "content", None):
     print("No text content in the response")
@@ -1,46 +1,306 @@
 import os
+import re
+import copy
+import gzip
 import json
-import requests
-from openai import OpenAI
+import math
+import time
+import hashlib
+import datetime
+import asyncio
+import logging
+import argparse
+import importlib.util
+import httpx
+from pathlib import Path
+from openai import AsyncOpenAI, NotFoundError
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(
+logger = logging.getLogger(__name__)
+
+# Shared HTTP client for svatkyapi.cz and the OpenAI API, one connection pool for both.
+# HTTP/2 needs the optional h2 package, without it we stay on HTTP/1.1 keep-alive.
+# Timeouts are not set here: the OpenAI SDK would adopt them for LLM calls.
+http_client = httpx.AsyncClient(
+    transport=httpx.AsyncHTTPTransport(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        retries=3,
+    ),
+)
+
+# svatkyapi.cz answers quickly, every request to it passes this timeout
+SVATKY_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+
+# Initialize OpenAI client. Generations can take minutes, the timeout matches the SDK default.
+client = AsyncOpenAI(
     api_key=os.environ.get("OPENAI_API_KEY"),
+    http_client=http_client,
+    timeout=httpx.Timeout(600.0, connect=5.0),
 )
 
+# svatkyapi.cz responses are decoded by msgspec's C decoder when it is installed.
+# The decoder is built once, records stay plain dicts either way.
+if importlib.util.find_spec("msgspec") is not None:
+    import msgspec
+
+    decode_svatky_json = msgspec.json.Decoder().decode
+    SVATKY_DECODE_ERRORS = (ValueError, msgspec.DecodeError)
+else:
+    decode_svatky_json = json.loads
+    SVATKY_DECODE_ERRORS = (ValueError,)
+
+
+# Completions of identical deterministic requests, kept on disk for a day so that
+# repeated runs of the script do not pay for the same LLM call again
+LLM_CACHE_DIR = Path.home() / ".cache" / "course_ai_agents" / "completions"
+LLM_CACHE_TTL = 86400
+
+
+def _load_cached_completion(key: str) -> Optional[ChatCompletion]:
+    try:
+        with open(LLM_CACHE_DIR / f"{key}.json", encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry["expires"] > time.time():
+            return ChatCompletion.model_validate(entry["response"])
+    except (OSError, ValueError, KeyError):
+        pass  # A missing or unreadable entry is a miss
+    return None
+
+
+def _store_completion(key: str, response: ChatCompletion):
+    entry = {"expires": time.time() + LLM_CACHE_TTL, "response": response.model_dump(mode="json")}
+    path = LLM_CACHE_DIR / f"{key}.json"
+    # Write to a temporary file first so a concurrent reader never sees half an entry
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not store completion in cache: %s", e)
+
+
+def _cache_key(model: str, messages, temperature: float = 0, **kwargs) -> str:
+    if kwargs.get("tools") is tools:
+        # The tool schemas never change, use their JSON serialized once at import
+        kwargs["tools"] = TOOLS_JSON
+    payload = {"model": model, "messages": messages, "temperature": temperature, **kwargs}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def create_completion(
+    model: str,
+    messages,
+    temperature: float = 0,
+    on_delta: Optional[Callable[[str], None]] = None,
+    **kwargs,
+) -> ChatCompletion:
+    """
+    Call the chat completions API, reusing stored responses to repeated temperature=0 requests.
+
+    When on_delta is given the response is streamed and on_delta receives the text
+    as it is generated, so an answer can be shown before it is complete.
+    """
+    request = dict(model=model, messages=messages, temperature=temperature, **kwargs)
+    if temperature > 0:
+        if on_delta:
+            return await _stream_completion(on_delta, **request)
+        return await client.chat.completions.create(**request)
+
+    key = _cache_key(**request)
+    response = _load_cached_completion(key)
+    if response is not None:
+        if on_delta and response.choices[0].message.content:
+            on_delta(response.choices[0].message.content)
+        return response
+
+    if on_delta:
+        response = await _stream_completion(on_delta, **request)
+    else:
+        response = await client.chat.completions.create(**request)
+    _store_completion(key, response)
+    return response
+
+
+async def _stream_completion(on_delta: Callable[[str], None], **request) -> ChatCompletion:
+    """Stream a chat completion, passing content deltas to on_delta, and assemble the full response."""
+    stream = await client.chat.completions.create(stream=True, **request)
+    completion: Dict[str, Any] = {"object": "chat.completion"}
+    content: List[str] = []
+    tool_calls: Dict[int, Dict[str, Any]] = {}
+    finish_reason = "stop"
+
+    async for chunk in stream:
+        completion.update(id=chunk.id, created=chunk.created, model=chunk.model)
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.delta.content:
+            content.append(choice.delta.content)
+            on_delta(choice.delta.content)
+        # Tool calls arrive in shards, the first shard of each call carries its id and name
+        for tc in choice.delta.tool_calls or []:
+            call = tool_calls.setdefault(
+                tc.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+            )
+            if tc.id:
+                call["id"] = tc.id
+            if tc.function and tc.function.name:
+                call["function"]["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                call["function"]["arguments"] += tc.function.arguments
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+
+    message = {
+        "role": "assistant",
+        "content": "".join(content) or None,
+        "tool_calls": [tool_calls[i] for i in sorted(tool_calls)] or None,
+    }
+    completion["choices"] = [{"index": 0, "finish_reason": finish_reason, "message": message}]
+    return ChatCompletion.model_validate(completion)
+
+
+async def warm_up_http_client():
+    """Open the svatkyapi.cz connection (DNS, TCP, TLS) before the first tool call needs it."""
+    try:
+        await http_client.head("https://svatkyapi.cz/", timeout=SVATKY_TIMEOUT)
+    except httpx.HTTPError:
+        pass  # The tool call will simply pay for the connection itself
+
+
+# Decoded svatkyapi.cz responses by API path, data for a given date never changes
+SVATKY_CACHE_SIZE = 4096
+_svatky_cache: Dict[str, Any] = {}
+
+
+async def fetch_svatky_uncached(path: str):
+    """Return decoded JSON for a svatkyapi.cz API path, or None when the request fails."""
+    try:
+        response = await http_client.get(f"https://svatkyapi.cz/api/{path}", timeout=SVATKY_TIMEOUT)
+        if response.status_code != 200:
+            return None
+        return decode_svatky_json(response.content)
+    except (httpx.HTTPError, *SVATKY_DECODE_ERRORS):
+        # Timeouts, connection errors and malformed bodies are reported like a bad status
+        return None
+
+
+async def fetch_svatky(path: str):
+    """
+    Return decoded JSON for a svatkyapi.cz API path, or None when the request fails.
+
+    Successful responses are cached for the lifetime of the process, callers must
+    not mutate the returned data.
+    """
+    if path not in _svatky_cache:
+        data = await fetch_svatky_uncached(path)
+        if data is None:
+            return None
+        if len(_svatky_cache) >= SVATKY_CACHE_SIZE:
+            # Evict the oldest entry, dicts keep insertion order
+            del _svatky_cache[next(iter(_svatky_cache))]
+        _svatky_cache[path] = data
+    return _svatky_cache[path]
+
+
+# Day records of whole years by year and "YYYY-MM-DD", filled by preload_year
+SVATKY_CACHE_DIR = Path.home() / ".cache" / "svatky"
+SVATKY_PRELOAD_CONCURRENCY = 4
+_year_tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_year_preloads: Dict[str, asyncio.Task] = {}
+
+
+async def preload_year(year: int):
+    """Load every day record of a year from the disk cache, or fetch it week by week."""
+    path = SVATKY_CACHE_DIR / f"{year}.json.gz"
+    if path.exists():
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                _year_tables[str(year)] = json.load(f)
+            return
+        except (OSError, EOFError, ValueError):
+            # Truncated or corrupt, e.g. from an interrupted write, fetch the year again
+            logger.warning("Ignoring unreadable name day cache %s", path)
+            path.unlink(missing_ok=True)
+
+    # Fetched in the background next to real tool and LLM calls, keep it polite
+    semaphore = asyncio.Semaphore(SVATKY_PRELOAD_CONCURRENCY)
+
+    async def fetch_week(day: datetime.date):
+        async with semaphore:
+            return await fetch_svatky_uncached(f"week/{day.isoformat()}")
+
+    first_day = datetime.date(year, 1, 1)
+    weeks = await asyncio.gather(
+        *(fetch_week(first_day + datetime.timedelta(weeks=i)) for i in range(53))
+    )
+
+    # Failed weeks are skipped, their days keep going over the network
+    table = {
+        day["date"]: day
+        for week in weeks
+        if week is not None
+        for day in week
+        if str(day.get("date", "")).startswith(f"{year}-")
+    }
+    _year_tables[str(year)] = table
+
+    # Only a complete year is worth keeping for later runs. It is written to a temporary
+    # file first, so an interrupted run cannot leave a truncated cache behind.
+    if all(week is not None for week in weeks):
+        SVATKY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(table, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def schedule_year_preload():
+    """Start loading the current year in the background unless it is loaded or loading."""
+    year = datetime.date.today().year
+    if str(year) not in _year_tables and str(year) not in _year_preloads:
+        _year_preloads[str(year)] = asyncio.create_task(preload_year(year))
+
+
+def preloaded_day(date: str) -> Optional[Dict[str, Any]]:
+    """Return the preloaded record for a YYYY-MM-DD date, None if its year is not loaded."""
+    return _year_tables.get(date[:4], {}).get(date)
+
 
 # Tool functions
-def get_name_for_day(date: str):
-    response = requests.get(f"https://svatkyapi.cz/api/day/{date}")
-    if response.status_code == 200:
-        data = response.json()
+async def get_name_for_day(date: str):
+    data = preloaded_day(date) or await fetch_svatky(f"day/{date}")
+    if data is not None:
         name = data.get("name")
         return {"date": date, "name": name}
     else:
         return {"date": date, "name": "Error fetching data"}
 
-def get_all_info_about_day(date: str):
-    response = requests.get(f"https://svatkyapi.cz/api/day/{date}")
-    if response.status_code == 200:
-        data = response.json()
-        return {"date": date, "data": data}
+async def get_all_info_about_day(date: str):
+    data = preloaded_day(date)
+    if data is None or "isHoliday" not in data:
+        # Week records may not carry every field, the day endpoint does
+        data = await fetch_svatky(f"day/{date}")
+    if data is not None:
+        return {"date": date, "data": copy.deepcopy(data)}
     else:
         return {"date": date, "data": "Error fetching data"}
 
-def get_names_for_week(date: str):
-    response = requests.get(f"https://svatkyapi.cz/api/week/{date}")
-    if response.status_code == 200:
-        data = response.json()
-        weekData = data.map(lambda day: {
-            day.get("name"),
-            day.get("date"),
-            day.get("dayInWeek")
-        })
+async def get_names_for_week(date: str):
+    data = await fetch_svatky(f"week/{date}")
+    if data is not None:
+        weekData = [
+            {"name": day.get("name"), "date": day.get("date"), "dayInWeek": day.get("dayInWeek")}
+            for day in data
+        ]
         return {"date": date, "weekData": weekData}
     else:
         return {"date": date, "weekData": "Error fetching data"}
@@ -86,7 +346,7 @@ tools = [
         "type": "function",
         "function": {
             "name": "get_names_for_week",
-            "description": "Returns information about next week starting from given date. Fields for each day: date, dayInWeek, name.",
+            "description": "Returns information about next week starting from given date. Fields for each day: date, dayInWeek, name. Prefer this over multiple get_name_for_day calls when requested dates fall within 7 days.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -101,6 +361,9 @@ tools = [
     }
 ]
 
+# tools is passed to the API by identity and never modified, so it is serialized only once
+TOOLS_JSON = json.dumps(tools, sort_keys=True)
+
 available_functions = {
     "get_name_for_day": get_name_for_day,
     "get_all_info_about_day": get_all_info_about_day,
@@ -108,43 +371,457 @@ available_functions = {
 }
 
 
+# The Responses API takes flat tool definitions without the nested "function" object
+response_tools = [{"type": "function", **tool["function"]} for tool in tools]
+
+
+def _response_input(messages: List[Dict[str, Any]], continues_stored_response: bool) -> List[Dict[str, Any]]:
+    """Convert chat messages to Responses API input items."""
+    items = []
+    for message in messages:
+        if message["role"] == "tool":
+            items.append(
+                {
+                    "type": "function_call_output",
+                    "call_id": message["tool_call_id"],
+                    "output": message["content"],
+                }
+            )
+            continue
+        if message["role"] == "assistant" and continues_stored_response:
+            # Output of the stored response itself, text and tool calls are already known
+            continue
+        if message.get("content"):
+            items.append({"role": message["role"], "content": message["content"]})
+        for tc in message.get("tool_calls") or []:
+            items.append(
+                {
+                    "type": "function_call",
+                    "call_id": tc["id"],
+                    "name": tc["function"]["name"],
+                    "arguments": tc["function"]["arguments"],
+                }
+            )
+    return items
+
+
+async def create_response_message(
+    model: str,
+    messages: List[Dict[str, Any]],
+    previous_response_id: Optional[str] = None,
+    **kwargs,
+) -> Tuple[ChatCompletionMessage, str]:
+    """
+    Continue a conversation stored on the server through the Responses API.
+
+    Only messages added since the previous response have to be passed. The reply is
+    returned as a chat completion message together with the new response id.
+    """
+    response = await client.responses.create(
+        model=model,
+        input=_response_input(messages, continues_stored_response=previous_response_id is not None),
+        previous_response_id=previous_response_id,
+        store=True,
+        temperature=0,
+        **kwargs,
+    )
+    tool_calls = [
+        {
+            "id": item.call_id,
+            "type": "function",
+            "function": {"name": item.name, "arguments": item.arguments},
+        }
+        for item in response.output
+        if item.type == "function_call"
+    ]
+    message = ChatCompletionMessage(
+        role="assistant", content=response.output_text or None, tool_calls=tool_calls or None
+    )
+    return message, response.id
+
+
+# Word prefixes of Czech month names in any grammatical case. July comes before June
+# because all its forms ("červenec", "července", "červenče", ...) start with "červen".
+MONTH_PREFIXES = [
+    (7, ("červenec", "červenc", "července", "červenč")),
+    (1, ("leden", "ledn")),
+    (2, ("únor",)),
+    (3, ("břez",)),
+    (4, ("duben", "dubn")),
+    (5, ("květen", "květn")),
+    (6, ("červen", "červn")),
+    (8, ("srpen", "srpn")),
+    (9, ("září",)),
+    (10, ("říjen", "října", "říjn")),
+    (11, ("listopad",)),
+    (12, ("prosin",)),
+]
+
+# Every singular case form of each month, MONTH_PREFIXES must map all of them correctly
+MONTH_CASE_FORMS = {
+    1: ("leden", "ledna", "lednu", "ledne", "lednem"),
+    2: ("únor", "února", "únoru", "únore", "únorem"),
+    3: ("březen", "března", "březnu", "březne", "březnem"),
+    4: ("duben", "dubna", "dubnu", "dubne", "dubnem"),
+    5: ("květen", "května", "květnu", "květne", "květnem"),
+    6: ("červen", "června", "červnu", "červne", "červnem"),
+    7: ("červenec", "července", "červenci", "červenče", "červencem"),
+    8: ("srpen", "srpna", "srpnu", "srpne", "srpnem"),
+    9: ("září", "zářím"),
+    10: ("říjen", "října", "říjnu", "říjne", "říjnem"),
+    11: ("listopad", "listopadu", "listopade", "listopadem"),
+    12: ("prosinec", "prosince", "prosinci", "prosinče", "prosincem"),
+}
+
+
+def month_of_word(word: str) -> Optional[int]:
+    """Return the month number a lowercase Czech word names, None if it is no month."""
+    for month, prefixes in MONTH_PREFIXES:
+        if word.startswith(prefixes):
+            return month
+    return None
+
+
+# Cheap enough to verify at import, a wrong prefix would let the semantic cache mix up months
+assert all(
+    month_of_word(form) == month for month, forms in MONTH_CASE_FORMS.items() for form in forms
+), "MONTH_PREFIXES maps a month form to the wrong month"
+
+# Dates relative to today, the same words mean a different day on every run
+RELATIVE_DATE_WORDS = re.compile(
+    r"\b(dnes|dneska|zítr|včer|pozítří|předevčírem|příšt|minul|letos|loni|tento|teď|nyní)",
+    re.IGNORECASE,
+)
+
+
+def date_key(query: str) -> Optional[Tuple[str, ...]]:
+    """
+    Return the numbers and months mentioned in a query, in order.
+
+    Queries naming different dates embed almost identically, so a cached answer is
+    only reused when this key matches exactly. None means the query uses a relative
+    date and must not be cached at all.
+    """
+    if RELATIVE_DATE_WORDS.search(query):
+        return None
+    key = []
+    for word in re.findall(r"\w+", query.lower()):
+        if word.isdigit():
+            key.append(word)
+            continue
+        month = month_of_word(word)
+        if month is not None:
+            key.append(f"month:{month}")
+    return tuple(key)
+
+
+class SemanticCache:
+    """
+    Reuses final answers for user queries that are paraphrases of earlier ones.
+
+    A hit needs both the query and its conversation context (the preceding user and
+    assistant turns) to match, so follow-ups like "a co další den?" are not answered
+    with the reply to an unrelated conversation.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        context_threshold: float = 0.85,
+        context_turns: int = 3,
+        model: str = "text-embedding-3-small",
+    ):
+        self.threshold = threshold
+        self.context_threshold = context_threshold
+        self.context_turns = context_turns
+        self.model = model
+        # (query embedding, context embedding, date key of the query, final answer)
+        self.entries: List[
+            Tuple[List[float], Optional[List[float]], Tuple[str, ...], str]
+        ] = []
+
+    async def embed(self, text: str) -> List[float]:
+        """Return the unit-length embedding of text."""
+        response = await client.embeddings.create(model=self.model, input=text)
+        embedding = response.data[0].embedding
+        norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+        return [x / norm for x in embedding]
+
+    async def embed_conversation(
+        self, messages: List[Dict[str, Any]]
+    ) -> Tuple[str, List[float], Optional[List[float]]]:
+        """Return the last user query, its embedding and the embedding of its context."""
+        turns = [m for m in messages if m["role"] in ("user", "assistant") and m.get("content")]
+        query = turns[-1]["content"]
+        context = "\n".join(m["content"] for m in turns[:-1][-self.context_turns:])
+        if not context:
+            return query, await self.embed(query), None
+        query_embedding, context_embedding = await asyncio.gather(
+            self.embed(query), self.embed(context)
+        )
+        return query, query_embedding, context_embedding
+
+    @staticmethod
+    def _similarity(a: Optional[List[float]], b: Optional[List[float]]) -> float:
+        if a is None or b is None:
+            # Two empty contexts are identical, an empty and a non-empty one never match
+            return 1.0 if a is b else 0.0
+        return sum(x * y for x, y in zip(a, b))
+
+    def lookup(
+        self, query: str, query_embedding: List[float], context_embedding: Optional[List[float]]
+    ) -> Optional[str]:
+        """Return the cached answer of the most similar earlier query, if close enough."""
+        key = date_key(query)
+        if key is None:
+            return None
+        best_score, best_answer = self.threshold, None
+        for cached_query, cached_context, cached_key, answer in self.entries:
+            if cached_key != key:
+                continue
+            if self._similarity(context_embedding, cached_context) < self.context_threshold:
+                continue
+            score = self._similarity(query_embedding, cached_query)
+            if score >= best_score:
+                best_score, best_answer = score, answer
+        return best_answer
+
+    def add(
+        self,
+        query: str,
+        query_embedding: List[float],
+        context_embedding: Optional[List[float]],
+        answer: str,
+    ):
+        key = date_key(query)
+        if key is not None:
+            self.entries.append((query_embedding, context_embedding, key, answer))
+
+
+# Czech month names in genitive, as used in dates like "28. října 2024"
+CZECH_MONTHS = [
+    "ledna", "února", "března", "dubna", "května", "června",
+    "července", "srpna", "září", "října", "listopadu", "prosince",
+]
+
+# Plain "who has the name day on <date>" questions that need no reasoning at all
+NAME_DAY_QUESTION = re.compile(
+    r"^\s*kdo\s+(měl|má|bude\s+mít)\s+svátek\s+(\d{1,2})\.?\s*("
+    + "|".join(CZECH_MONTHS)
+    + r")\s+(\d{4})\s*\??\s*$",
+    re.IGNORECASE,
+)
+
+
+# Dates like "3. ledna 2024" or "28. a 30. října 2024", several days can share a month
+DATE_PHRASE = re.compile(r"((?:\d{1,2}\.\s*(?:,|a)?\s*)+)([^\W\d_]+)\s+(\d{4})")
+NUMERIC_DATE = re.compile(r"\b(\d{1,2})\.\s*(\d{1,2})\.\s*(\d{4})\b|\b(\d{4})-(\d{2})-(\d{2})\b")
+
+
+def dates_in_query(query: str) -> Set[str]:
+    """
+    Return the YYYY-MM-DD dates a query asks about.
+
+    An empty set means the dates are unknown, e.g. "28. října" without a year, or a
+    relative date, and no assumption about them can be made.
+    """
+    if RELATIVE_DATE_WORDS.search(query):
+        return set()
+
+    parts = []
+    month_phrases = 0
+    for days, month_word, year in DATE_PHRASE.findall(query):
+        month = month_of_word(month_word.lower())
+        if month is None:
+            continue
+        month_phrases += 1
+        parts.extend((int(year), month, int(day)) for day in re.findall(r"\d{1,2}", days))
+    for day, month, year, iso_year, iso_month, iso_day in NUMERIC_DATE.findall(query):
+        if year:
+            parts.append((int(year), int(month), int(day)))
+        else:
+            parts.append((int(iso_year), int(iso_month), int(iso_day)))
+
+    # A month mentioned outside a complete date phrase is a date we could not read
+    month_words = sum(month_of_word(word) is not None for word in re.findall(r"\w+", query.lower()))
+    if month_words > month_phrases:
+        return set()
+
+    try:
+        return {datetime.date(*part).isoformat() for part in parts}
+    except ValueError:
+        return set()
+
+
+def dates_in_results(results) -> Set[str]:
+    """Return the dates covered by successful tool results."""
+    dates = set()
+    for result in results:
+        if isinstance(result.get("weekData"), list):
+            dates.update(str(day.get("date")) for day in result["weekData"])
+        else:
+            dates.add(result["date"])
+    return dates
+
+
+async def answer_name_day_question(query: str) -> Optional[str]:
+    """Answer a simple name day question directly, or return None if the LLM is needed."""
+    match = NAME_DAY_QUESTION.match(query)
+    if not match:
+        return None
+
+    verb, day, month, year = match.groups()
+    try:
+        date = datetime.date(int(year), CZECH_MONTHS.index(month.lower()) + 1, int(day))
+    except ValueError:
+        return None
+
+    try:
+        result = await get_name_for_day(date.isoformat())
+    except Exception:
+        # The fast path is only a shortcut, any failure is left to the ReAct loop
+        logger.debug("Direct name day lookup failed", exc_info=True)
+        return None
+    if result["name"] in (None, "Error fetching data"):
+        return None
+    # "bude mít" may be split by any whitespace in the question
+    verb = " ".join(verb.lower().split())
+    return f"{date.day}. {month.lower()} {date.year} {verb} svátek {result['name']}."
+
+
 class ReactAgent:
     """A ReAct (Reason and Act) agent that handles multiple tool calls."""
 
-    def __init__(self, model: str = "gpt-4o"):
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        stream: bool = False,
+        semantic_cache: bool = False,
+        responses_api: bool = False,
+    ):
         self.model = model
+        # Print answer text as it is generated, only readable for one conversation at a time
+        self.stream = stream
         self.max_iterations = 10  # Prevent infinite loops
+        # Costs an embedding call before every run and only pays off for paraphrased
+        # repeats within one process, so it is opt-in
+        self.semantic_cache = SemanticCache() if semantic_cache else None
+        # Send only new messages of a conversation stored on the server. Opt-in, because
+        # those replies bypass the completion cache that repeated runs rely on.
+        self.use_responses_api = responses_api and hasattr(client, "responses")
+
+    @staticmethod
+    def _print_delta(text: str):
+        print(text, end="", flush=True)
+
+    async def _call_llm(
+        self, messages: List[Dict[str, Any]], conversation: Dict[str, Any], use_tools: bool
+    ) -> ChatCompletionMessage:
+        """
+        Get the next assistant message.
 
-    def run(self, messages: List[Dict[str, Any]]) -> str:
+        By default chat completions are used, which are cached and can be streamed.
+        With the Responses API enabled and streaming off only the new turns are
+        uploaded instead, but those replies are not cached.
+        """
+        if self.use_responses_api and not self.stream and not conversation["chat_completions"]:
+            tool_kwargs = {"tools": response_tools, "tool_choice": "auto"} if use_tools else {}
+            try:
+                message, conversation["previous_response_id"] = await create_response_message(
+                    self.model,
+                    messages[conversation["sent"]:],
+                    conversation["previous_response_id"],
+                    **tool_kwargs,
+                )
+                conversation["sent"] = len(messages)
+                return message
+            except NotFoundError as exc:
+                if conversation["previous_response_id"] is None and exc.param is None:
+                    # The endpoint itself is missing, e.g. on an OpenAI compatible server
+                    logger.warning("Responses API not available, falling back to chat completions")
+                    self.use_responses_api = False
+                else:
+                    # E.g. an expired previous_response_id, chat completions resend the
+                    # whole history, so this conversation can finish without it
+                    logger.warning("Stored response not found, finishing conversation with chat completions")
+                    conversation["chat_completions"] = True
+
+        tool_kwargs = {"tools": tools, "tool_choice": "auto"} if use_tools else {}
+        response = await create_completion(
+            model=self.model,
+            messages=messages,
+            on_delta=self._print_delta if self.stream else None,
+            **tool_kwargs,
+        )
+        return response.choices[0].message
+
+    async def run(self, messages: List[Dict[str, Any]]) -> str:
         """
         Run the ReAct loop until we get a final answer.
 
         The agent will:
         1. Call the LLM
-        2. If tool calls are returned, execute them
+        2. If tool calls are returned, execute them concurrently
         3. Add results to conversation and repeat
         4. Continue until LLM returns only text (no tool calls)
+
+        Simple name day questions are answered without the LLM and, when the semantic
+        cache is enabled, answers to paraphrases of earlier queries are reused.
         """
+        # Day lookups of the current year are served from memory once this finishes
+        schedule_year_preload()
+
+        last_user_message = next(m for m in reversed(messages) if m["role"] == "user")
+        direct_answer = await answer_name_day_question(last_user_message["content"])
+        if direct_answer is not None:
+            logger.debug("Direct answer: %s", direct_answer)
+            if self.stream:
+                self._print_delta(direct_answer)
+            messages.append({"role": "assistant", "content": direct_answer})
+            return direct_answer
+
+        if self.semantic_cache is not None:
+            query, query_embedding, context_embedding = await self.semantic_cache.embed_conversation(messages)
+            cached_answer = self.semantic_cache.lookup(query, query_embedding, context_embedding)
+            if cached_answer is not None:
+                logger.debug("Semantic cache hit: %s", cached_answer)
+                if self.stream:
+                    self._print_delta(cached_answer)
+                messages.append({"role": "assistant", "content": cached_answer})
+                return cached_answer
+
         iteration = 0
+        # Dates the user asks about, once tool results cover all of them only the
+        # answer is missing
+        requested_dates = dates_in_query(last_user_message["content"])
+        force_answer = False
+        previous_content = None
+        # Successful results by (tool name, canonical arguments), to spot the model
+        # repeating itself. Failed calls are not kept, so the model can retry them.
+        tool_results: Dict[Tuple[str, str], Any] = {}
+        # Server side conversation state of the Responses API
+        conversation = {"previous_response_id": None, "sent": 0, "chat_completions": False}
 
         while iteration < self.max_iterations:
             iteration += 1
-            print(f"\n--- Iteration {iteration} ---")
-
-            # Call the LLM
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
-                parallel_tool_calls=False,
+            logger.debug("--- Iteration %d ---", iteration)
+
+            # Call the LLM. When successful tool results already cover every requested
+            # date the model only has to write the answer, so the tool schemas are left
+            # out of the request. Otherwise it may still need another lookup.
+            answered = bool(requested_dates) and requested_dates <= dates_in_results(tool_results.values())
+            response_message = await self._call_llm(
+                messages, conversation, use_tools=not (answered or force_answer)
             )
+            logger.debug("LLM Response: %s", response_message)
 
-            response_message = response.choices[0].message
-            print(f"LLM Response: {response_message}")
+            # Repeating the previous message word for word means the model is looping,
+            # the text is taken as the final answer
+            looping = bool(response_message.content) and response_message.content == previous_content
+            previous_content = response_message.content
 
             # Check if there are tool calls
-            if response_message.tool_calls:
+            if response_message.tool_calls and not looping:
                 # Add the assistant's message with tool calls to history
                 messages.append(
                     {
@@ -164,30 +841,57 @@ class ReactAgent:
                     }
                 )
 
-                # Process ALL tool calls (not just the first one)
-                for tool_call in response_message.tool_calls:
-                    function_name = tool_call.function.name
+                # Run ALL tool calls concurrently, they are independent lookups
+                tool_calls = response_message.tool_calls
+                keys = []
+                pending = {}
+                repeated = False
+                for tool_call in tool_calls:
+                    # Arguments are parsed once, the history keeps the original JSON string
                     function_args = json.loads(tool_call.function.arguments)
-                    tool_id = tool_call.id
-
-                    print(f"Executing tool: {function_name}({function_args})")
-
-                    # Call the function
-                    function_to_call = available_functions[function_name]
-                    function_response = function_to_call(**function_args)
+                    key = (tool_call.function.name, json.dumps(function_args, sort_keys=True))
+                    keys.append(key)
+                    if key in tool_results:
+                        logger.debug("Repeated tool call: %s(%s)", tool_call.function.name, function_args)
+                        repeated = True
+                    elif key not in pending:
+                        logger.debug("Executing tool: %s(%s)", tool_call.function.name, function_args)
+                        pending[key] = available_functions[tool_call.function.name](**function_args)
+
+                fresh_results = dict(zip(pending, await asyncio.gather(*pending.values())))
+                tool_results.update(
+                    (key, result)
+                    for key, result in fresh_results.items()
+                    if "Error fetching data" not in result.values()
+                )
+                results = [
+                    tool_results[key] if key in tool_results else fresh_results[key] for key in keys
+                ]
 
-                    print(f"Tool result: {function_response}")
+                # Add tool responses to messages in the original order
+                for tool_call, function_response in zip(tool_calls, results):
+                    logger.debug("Tool result: %s", function_response)
 
-                    # Add tool response to messages
                     messages.append(
                         {
                             "role": "tool",
-                            "tool_call_id": tool_id,
-                            "name": function_name,
+                            "tool_call_id": tool_call.id,
+                            "name": tool_call.function.name,
                             "content": json.dumps(function_response),
                         }
                     )
 
+                if repeated:
+                    # Calling the same tool again will not help, make the model answer
+                    messages.append(
+                        {
+                            "role": "system",
+                            "content": "You already called this tool with the same arguments. "
+                            "Answer the user now using the results above.",
+                        }
+                    )
+                    force_answer = True
+
                 # Continue the loop to get the next response
                 continue
 
@@ -197,49 +901,102 @@ class ReactAgent:
 
                 # Add the final assistant message to history
                 messages.append({"role": "assistant", "content": final_content})
+                if final_content and self.semantic_cache is not None:
+                    self.semantic_cache.add(query, query_embedding, context_embedding, final_content)
 
-                print(f"\nFinal answer: {final_content}")
+                logger.debug("Final answer: %s", final_content)
                 return final_content
 
         # If we hit max iterations, return an error
         return "Error: Maximum iterations reached without getting a final answer."
 
 
-def main():
+async def main(stream: bool = False, semantic_cache: bool = False, responses_api: bool = False):
+    # Connect to svatkyapi.cz while the first LLM calls are in flight
+    warm_up = asyncio.create_task(warm_up_http_client())
+
     # Create a ReAct agent
-    agent = ReactAgent()
+    agent = ReactAgent(stream=stream, semantic_cache=semantic_cache, responses_api=responses_api)
 
     # Call 1 - This should call the simpler tool only
-    print("=== Call 1: Single simple tool call ===")
     messages1 = [
         {"role": "system", "content": "You are a helpful AI assistant."},
         {"role": "user", "content": "Kdo měl svátek 28. října 2024?"},
     ]
 
-    result1 = agent.run(messages1.copy())
-    print(f"\nResult: {result1}")
-
     # Call 2
-    print("\n\n=== Call 2: Multiple call of same tool ===")
     messages2 = [
         {"role": "system", "content": "You are a helpful AI assistant."},
         {"role": "user", "content": "Zjisti mi detalní informace o dnech 3. ledna 2024 a 3. ledna 2012?"},
     ]
 
-    result2 = agent.run(messages2.copy())
-    print(f"\nResult: {result2}")
-
     # Call 3
-    print("\n\n=== Call 3: Test how smart is LLM when selecting tool ===")
     # LLM can call the week tool instead of calling the day tool twice
     messages3 = [
         {"role": "system", "content": "You are a helpful AI assistant."},
         {"role": "user", "content": "Kdo měl svátek 28. a 30. října 2024?"},
     ]
 
-    result3 = agent.run(messages3.copy())
-    print(f"\nResult: {result3}")
+    titles = [
+        "Call 1: Single simple tool call",
+        "Call 2: Multiple call of same tool",
+        "Call 3: Test how smart is LLM when selecting tool",
+    ]
+    conversations = [messages1, messages2, messages3]
+
+    # run() only appends to the lists it is given, so no copies are needed
+    if stream:
+        # Streamed answers are only readable one conversation at a time
+        for title, messages in zip(titles, conversations):
+            print(f"\n\n=== {title} ===")
+            await agent.run(messages)
+            print()
+    else:
+        # The conversations are independent, so run them concurrently
+        results = await asyncio.gather(*(agent.run(messages) for messages in conversations))
+        for title, result in zip(titles, results):
+            print(f"\n\n=== {title} ===")
+            print(f"\nResult: {result}")
+
+    await warm_up
+
+
+async def run_main(**kwargs):
+    try:
+        await main(**kwargs)
+    finally:
+        # An unfinished year preload is retried on the next start
+        for task in _year_preloads.values():
+            task.cancel()
+        await asyncio.gather(*_year_preloads.values(), return_exceptions=True)
+
+        # Close pooled connections before the event loop shuts down,
+        # this also closes the OpenAI client which shares them
+        await http_client.aclose()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="ReAct agent answering Czech name day questions.")
+    parser.add_argument("--verbose", action="store_true", help="Log LLM responses and tool calls.")
+    parser.add_argument(
+        "--stream", action="store_true", help="Print answers as they are generated, one call at a time."
+    )
+    parser.add_argument(
+        "--semantic-cache", action="store_true", help="Reuse answers to paraphrased questions."
+    )
+    parser.add_argument(
+        "--responses-api",
+        action="store_true",
+        help="Keep conversations on the server and send only new turns (not cached).",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(format="%(message)s")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+
+    asyncio.run(
+        run_main(
+            stream=args.stream,
+            semantic_cache=args.semantic_cache,
+            responses_api=args.responses_api,
+        )
+    )